@@ -1,7 +1,9 @@
 import cli
 
-args = cli.parser.parse_args()
+# The guard keeps worker processes (see --processes) from rerunning the command
+if __name__ == '__main__':
+    args = cli.parser.parse_args()
 
-# Send args to to the engine. It will take things from here.
-if args.which_kind:
-    cli.engine_dict[args.which_kind].run(args)
+    # Send args to to the engine. It will take things from here.
+    if args.which_kind:
+        cli.engine_dict[args.which_kind].run(args)
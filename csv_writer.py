@@ -0,0 +1,420 @@
+'''
+This module contains the CSV-writing code shared by the engines.
+
+Rather than formatting one line at a time, it formats whole blocks of NumPy
+columns at once and writes each block with a single call. Blocks can optionally
+be formatted by a pool of worker threads or processes; they are always written
+in their original order. Output is compressed with gzip or zstd when the output
+filepath ends in ".gz" or ".zst".
+
+Output can also be split into a directory of shards, partitioned by read or by
+position, with a "manifest.json" file that records the rows and the range of
+reads or positions in each shard.
+'''
+
+# pylint: disable=invalid-name,global-statement,import-outside-toplevel
+
+
+import os
+import json
+from collections import deque
+from functools import partial
+
+
+DEFAULT_CHUNK_SIZE = 10000
+
+# Which column (or column axis, for wide data) each --shard-by choice refers to
+SHARD_KEYS = {
+    'read': 'read_id',
+    'position': 'pos_0b',
+}
+
+MANIFEST_NAME = 'manifest.json'
+
+
+def add_arguments(parser):
+    '''Attach the output-formatting options shared by every subcommand to the
+    given parser.'''
+
+    parser.add_argument('--float-format', metavar='FORMAT', default=None,
+        help='printf-style format for floating-point values, e.g. "%%.4g" '
+        '(DEFAULT: shortest exact representation)')
+
+    parser.add_argument('--workers', metavar='N', default=None, type=int,
+        help='Number of workers used to read --sample files, to format '
+        'blocks of the output, or to write shards when --shard-by is given '
+        '(DEFAULT: one process per --sample file, up to the number of CPUs, '
+        'when reading samples; otherwise 1)')
+
+    parser.add_argument('--processes', action='store_true',
+        help='Use worker processes rather than worker threads')
+
+
+def writer_options(args):
+    '''Collect the keyword arguments of write_df and write_columns from the
+    parsed command-line arguments.'''
+
+    return {
+        'float_format': args.float_format,
+        'workers': args.workers if args.workers is not None else 1,
+        'processes': args.processes,
+    }
+
+
+def add_shard_arguments(parser):
+    '''Attach the options that split the output into shards to the given
+    parser.'''
+
+    parser.add_argument('--shard-by', choices=list(SHARD_KEYS), default=None,
+        help='Write OUTPUT-FILEPATH as a new (or empty) directory of CSV shards '
+        'partitioned by read or by position, plus a "manifest.json" describing '
+        'each shard')
+
+    grp = parser.add_mutually_exclusive_group()
+    grp.add_argument('--shards', metavar='N', type=int, default=None,
+        help='Number of shards to write when --shard-by is given; rows are '
+        'divided as evenly as possible without splitting a read or position')
+    grp.add_argument('--shard-size', metavar='N', type=int, default=None,
+        help='Instead of --shards, start a new shard after every N reads or '
+        'positions')
+
+
+def shard_options(args):
+    '''Collect the sharding keyword arguments of write_output from the parsed
+    command-line arguments.'''
+
+    return {
+        'shard_by': args.shard_by,
+        'shards': args.shards,
+        'shard_size': args.shard_size,
+    }
+
+
+def check_shard_args(parser, args, output_path):
+    '''Report inconsistent sharding options, or an OUTPUT-FILEPATH that
+    cannot hold shards, through parser.error. Call this before doing any work,
+    so that usage mistakes are not found only when the output is written.'''
+
+    if args.shard_by is None:
+        if args.shards is not None or args.shard_size is not None:
+            parser.error('--shards and --shard-size require --shard-by')
+        return
+
+    if args.shards is None and args.shard_size is None:
+        parser.error('--shard-by requires --shards or --shard-size')
+    for option, value in [('--shards', args.shards),
+                          ('--shard-size', args.shard_size)]:
+        if value is not None and value < 1:
+            parser.error(f'{option} must be at least 1')
+
+    problem = shard_dir_problem(output_path)
+    if problem is not None:
+        parser.error(problem)
+
+
+def open_output(output_path):
+    '''Open output_path for writing text. The file is gzip-compressed if
+    output_path ends in ".gz" and zstd-compressed if it ends in ".zst".'''
+
+    if output_path.endswith('.gz'):
+        import gzip
+        return gzip.open(output_path, 'wt')
+    if output_path.endswith('.zst'):
+        try:
+            import zstandard
+        except ImportError as e:
+            raise ImportError('Writing ".zst" files requires the "zstandard" '
+                'package') from e
+        return zstandard.open(output_path, 'wt')
+    return open(output_path, 'wt')
+
+
+def _quote(field):
+    '''Quote a single CSV field the way the csv module would'''
+    if any(c in field for c in ',"\n\r'):
+        return '"' + field.replace('"', '""') + '"'
+    return field
+
+
+def format_column(values, float_format=None):
+    '''Convert a one-dimensional array into an array of CSV fields.
+
+    Floats are formatted with float_format if it is given; NaNs and missing
+    values become empty fields, as they do in pandas.DataFrame.to_csv.'''
+
+    global np
+    import numpy as np
+
+    values = np.asarray(values)
+    kind = values.dtype.kind
+
+    if kind == 'f':
+        if float_format is None:
+            retval = values.astype(str)
+        else:
+            retval = np.char.mod(float_format, values)
+        retval[np.isnan(values)] = ''
+        return retval
+
+    if kind in 'iub':
+        return values.astype(str)
+
+    if kind == 'O':
+        retval = np.array([
+            '' if x is None or (isinstance(x, float) and x != x) else str(x)
+            for x in values
+        ], dtype=str)
+    else:
+        retval = values.astype(str)
+
+    if retval.size and any(np.char.count(retval, c).any() for c in ',"\n\r'):
+        retval = np.array([_quote(x) for x in retval.tolist()], dtype=str)
+    return retval
+
+
+def format_block(columns, float_format=None):
+    '''Format a list of equal-length columns as CSV rows, returned as a
+    single string with a trailing newline'''
+
+    fields = [format_column(col, float_format).tolist() for col in columns]
+    if not fields or not fields[0]:
+        return ''
+    return '\n'.join(map(','.join, zip(*fields))) + '\n'
+
+
+def write_blocks(outbuffer, header, blocks, float_format=None, workers=1,
+                 processes=False):
+    '''Write a header and a sequence of column blocks to outbuffer.
+
+    Arguments:
+        outbuffer:
+            a writable text buffer
+        header:
+            list of column names, or None to omit the header line
+        blocks:
+            iterable of lists of equal-length columns
+        float_format:
+            printf-style format for floating-point values
+        workers:
+            number of threads (or processes) that format blocks concurrently
+        processes:
+            use worker processes instead of worker threads
+    '''
+    global futures
+    from concurrent import futures
+
+    if header is not None:
+        outbuffer.write(','.join(_quote(str(x)) for x in header) + '\n')
+
+    fmt = partial(format_block, float_format=float_format)
+    if workers <= 1:
+        for block in blocks:
+            outbuffer.write(fmt(block))
+        return
+
+    # Keep only a bounded number of blocks in flight so that memory use does
+    # not grow with the size of the output
+    executor_cls = futures.ProcessPoolExecutor if processes \
+        else futures.ThreadPoolExecutor
+    with executor_cls(max_workers=workers) as executor:
+        pending = deque()
+        for block in blocks:
+            pending.append(executor.submit(fmt, block))
+            if len(pending) >= 2 * workers:
+                outbuffer.write(pending.popleft().result())
+        while pending:
+            outbuffer.write(pending.popleft().result())
+
+
+def write_columns(outbuffer, header, columns, chunk_size=DEFAULT_CHUNK_SIZE,
+                  **kwargs):
+    '''Write equal-length columns to outbuffer in blocks of chunk_size rows.
+    Additional keyword arguments are passed on to write_blocks.'''
+
+    n_rows = len(columns[0]) if columns else 0
+    blocks = (
+        [col[i:i + chunk_size] for col in columns]
+        for i in range(0, n_rows, chunk_size)
+    )
+    write_blocks(outbuffer, header, blocks, **kwargs)
+
+
+def write_df(df, outbuffer, index=True, chunk_size=DEFAULT_CHUNK_SIZE, **kwargs):
+    '''Write a pandas DataFrame to outbuffer. The output matches that of
+    df.to_csv(outbuffer, index=index), except for the formatting of floats.
+    Additional keyword arguments are passed on to write_blocks.'''
+
+    if index:
+        df = df.reset_index()
+    header = list(df.columns)
+    columns = [df.iloc[:, j].to_numpy() for j in range(df.shape[1])]
+    write_columns(outbuffer, header, columns, chunk_size=chunk_size, **kwargs)
+
+
+def write_output(df, output_path, index=True, shard_by=None, shards=None,
+                 shard_size=None, **kwargs):
+    '''Write a pandas DataFrame to output_path, either as a single CSV file or,
+    if shard_by is given, as a directory of shards (see write_shards).
+    Additional keyword arguments are passed on to write_blocks.'''
+
+    if shard_by is None:
+        if shards is not None or shard_size is not None:
+            raise ValueError('--shards and --shard-size require --shard-by')
+        with open_output(output_path) as output_file:
+            write_df(df, output_file, index=index, **kwargs)
+    else:
+        write_shards(df, output_path, SHARD_KEYS[shard_by], shards=shards,
+            shard_size=shard_size, index=index, **kwargs)
+
+
+def _shard_bounds(keys, shards=None, shard_size=None):
+    '''Split a sorted array of keys into contiguous (start, stop) ranges that
+    never divide a run of equal keys. Either make at most "shards" ranges of
+    roughly equal length, or start a new range every "shard_size" distinct
+    keys.'''
+
+    global np
+    import numpy as np
+
+    if shard_size is not None and shard_size < 1:
+        raise ValueError('--shard-size must be at least 1')
+    if shard_size is None and (shards is None or shards < 1):
+        raise ValueError('--shard-by requires --shards or --shard-size, '
+            'and --shards must be at least 1')
+
+    keys = np.asarray(keys)
+    n = len(keys)
+    if n == 0:
+        return [(0, 0)]
+
+    # index at which each distinct key first appears
+    key_starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+
+    if shard_size is not None:
+        starts = key_starts[::shard_size]
+    else:
+        targets = np.arange(shards) * n / shards
+        idx = np.searchsorted(key_starts, targets, side='left')
+        starts = np.unique(key_starts[idx[idx < key_starts.size]])
+
+    bounds = list(starts) + [n]
+    return [(int(a), int(b)) for a, b in zip(bounds[:-1], bounds[1:])]
+
+
+def _json_value(x):
+    '''Convert a read ID or position into something the json module can
+    serialize'''
+    if hasattr(x, 'item'):
+        x = x.item()
+    if isinstance(x, bytes):
+        x = x.decode()
+    return x
+
+
+def shard_dir_problem(output_dir):
+    '''Return a message explaining why shards cannot be written to output_dir,
+    or None if they can. Refusing non-empty directories keeps shards from an
+    earlier run from being mistaken for part of this one.'''
+    if not os.path.exists(output_dir):
+        return None
+    if not os.path.isdir(output_dir):
+        return f'"{output_dir}" already exists and is not a directory'
+    if os.listdir(output_dir):
+        return f'"{output_dir}" already exists and is not empty'
+    return None
+
+
+def _write_shard(shard_path, df, float_format=None):
+    '''Write one shard. This is a module-level function so that it can be
+    sent to worker processes.'''
+    with open_output(shard_path) as output_file:
+        write_df(df, output_file, index=False, float_format=float_format)
+
+
+def write_shards(df, output_dir, key, shards=None, shard_size=None, index=True,
+                 float_format=None, workers=1, processes=False):
+    '''Write a pandas DataFrame as a directory of CSV shards.
+
+    Arguments:
+        df:
+            the pandas DataFrame to write
+        output_dir:
+            directory to create; it must not exist or must be empty. Shards
+            are named "part-00000.csv" and so on; they are compressed if
+            output_dir ends in ".gz" or ".zst".
+        key:
+            If key names a column (after the index is reset), rows are sorted
+            by that column and partitioned by it. If instead key names the
+            column axis (as with wide data, where there is a column for every
+            position), the columns are partitioned and every shard keeps the
+            index columns.
+        shards, shard_size:
+            see _shard_bounds
+        index:
+            whether to write the index of df, as in write_df
+        float_format:
+            printf-style format for floating-point values
+        workers:
+            number of threads (or processes) that write shards concurrently
+        processes:
+            use worker processes instead of worker threads
+
+    Besides the shards, a "manifest.json" file is written that records the
+    shard key and, for every shard, its path, its numbers of rows and columns,
+    and its first and last key.
+    '''
+    global futures
+    from concurrent import futures
+
+    problem = shard_dir_problem(output_dir)
+    if problem is not None:
+        raise FileExistsError(problem)
+
+    id_columns = [name for name in df.index.names if name is not None] \
+        if index else []
+    if index:
+        df = df.reset_index()
+
+    if key in df.columns:
+        df = df.sort_values(key, kind='stable')
+        keys = df[key].to_numpy()
+        parts = [
+            (df.iloc[start:stop], keys[start:stop])
+            for start, stop in _shard_bounds(keys, shards, shard_size)
+        ]
+    elif df.columns.name == key:
+        data_columns = sorted(c for c in df.columns if c not in id_columns)
+        parts = [
+            (df[id_columns + data_columns[start:stop]], data_columns[start:stop])
+            for start, stop in _shard_bounds(data_columns, shards, shard_size)
+        ]
+    else:
+        raise ValueError(f'Cannot shard this output by "{key}"')
+
+    suffix = '.csv'
+    for compressed_suffix in ['.gz', '.zst']:
+        if output_dir.endswith(compressed_suffix):
+            suffix += compressed_suffix
+
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = {'key': key, 'shards': []}
+    executor_cls = futures.ProcessPoolExecutor if processes \
+        else futures.ThreadPoolExecutor
+    with executor_cls(max_workers=max(workers, 1)) as executor:
+        pending = []
+        for i, (part, part_keys) in enumerate(parts):
+            name = f'part-{i:05d}{suffix}'
+            pending.append(executor.submit(_write_shard,
+                os.path.join(output_dir, name), part, float_format))
+            manifest['shards'].append({
+                'path': name,
+                'rows': int(part.shape[0]),
+                'columns': int(part.shape[1]),
+                'first': _json_value(part_keys[0]) if len(part_keys) else None,
+                'last': _json_value(part_keys[-1]) if len(part_keys) else None,
+            })
+        for future in pending:
+            future.result()
+
+    with open(os.path.join(output_dir, MANIFEST_NAME), 'wt') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
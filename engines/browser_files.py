@@ -6,9 +6,17 @@ Chris Kimmel
 chris.kimmel@live.com
 '''
 
+# pylint: disable=global-statement,import-outside-toplevel
+
+
 from warnings import warn
 from argparse import RawTextHelpFormatter
 
+import csv_writer
+
+
+# Approximate number of characters of input to parse into each block of output
+CHUNK_HINT = 2**20
 
 DESCRIPTION = '''
 Convert wiggle and bedgraph files to CSV files.
@@ -44,47 +52,89 @@ def register(subparsers):
     parser.add_argument('output_filepath', metavar='OUTPUT-FILEPATH',
         help='Filepath to the output CSV, including the .csv extension.')
 
+    csv_writer.add_arguments(parser)
+
+
+def write_bed_to_csv(inbuffer, outbuffer, column_name, float_format=None,
+                     **kwargs):
+    '''Stream data from a BED format to a CSV format. Additional keyword
+    arguments are passed on to csv_writer.write_blocks.'''
+
+    global np
+    import numpy as np
+
+    header = ['pos_0b', column_name]
+
+    # consume bedgraph header
+    for _ in range(1):
+        _ = inbuffer.readline()
+
+    def blocks():
+        # columns: chrom, chromStart, chromEnd, dataValue
+        for rows in _line_chunks(inbuffer, 4):
+            starts = np.array([int(row[1]) for row in rows], dtype=np.int64)
+            ends = np.array([int(row[2]) for row in rows], dtype=np.int64)
+            lengths = ends - starts
+
+            # expand every interval into one row per position
+            offsets = np.repeat(np.cumsum(lengths) - lengths, lengths)
+            pos_0b = np.repeat(starts, lengths) + np.arange(offsets.size) - offsets
+            data = _data_column([row[3] for row in rows], float_format)
+            yield [pos_0b, np.repeat(data, lengths)]
+
+    csv_writer.write_blocks(outbuffer, header, blocks(),
+        float_format=float_format, **kwargs)
+
+
+def write_wig_to_csv(inbuffer, outbuffer, column_name, float_format=None,
+                     **kwargs):
+    '''Stream data from a WIG format to a CSV format. Additional keyword
+    arguments are passed on to csv_writer.write_blocks.'''
+
+    global np
+    import numpy as np
 
-def write_bed_to_csv(inbuffer, outbuffer, column_name):
-    '''Stream data from a BED format to a CSV format'''
+    header = ['pos_0b', column_name]
 
-    header = ','.join(['pos_0b', column_name])
+    # consume wiggle header
+    for _ in range(2):
+        _ = inbuffer.readline()
 
-    try:
-        # consume bedgraph header
-        for _ in range(1):
-            _ = inbuffer.readline()
-    except EOFError:
-        pass
-    finally:
-        print(header, file=outbuffer)
+    def blocks():
+        for rows in _line_chunks(inbuffer, 2):
+            pos_0b = np.array([int(row[0]) for row in rows], dtype=np.int64) - 1
+            data = _data_column([row[1] for row in rows], float_format)
+            yield [pos_0b, data]
 
-        # print contents
-        for line in inbuffer.readlines():
-            chrom, chromStart, chromEnd, dataValue = line.split() # pylint: disable=invalid-name,unused-variable
-            for pos_0b in map(str, range(int(chromStart), int(chromEnd))):
-                outbuffer.write(','.join([pos_0b, dataValue]) + '\n')
+    csv_writer.write_blocks(outbuffer, header, blocks(),
+        float_format=float_format, **kwargs)
 
 
-def write_wig_to_csv(inbuffer, outbuffer, column_name):
-    '''Stream data from a WIG format to a CSV format'''
+def _line_chunks(inbuffer, n_fields):
+    '''Read inbuffer a chunk of lines at a time, and yield each chunk as a list
+    of the fields on every non-blank line. Raise a ValueError if a line does not
+    have exactly n_fields fields.'''
 
-    header = ','.join(['pos_0b', column_name])
+    while True:
+        lines = inbuffer.readlines(CHUNK_HINT)
+        if not lines:
+            return
+        rows = [line.split() for line in lines]
+        rows = [row for row in rows if row]
+        for row in rows:
+            if len(row) != n_fields:
+                raise ValueError(f'Expected {n_fields} fields per line but '
+                    f'found {len(row)} in line "{" ".join(row)}"')
+        if rows:
+            yield rows
 
-    try:
-        # consume wiggle header
-        for _ in range(2):
-            _ = inbuffer.readline()
-    except EOFError:
-        pass
-    finally:
-        print(header, file=outbuffer)
 
-        # print contents
-        for line in inbuffer.readlines(): # line includes trailing newline
-            pos_ob, data = line.split()
-            pos_0b = str(int(pos_ob) - 1)
-            outbuffer.write(','.join([pos_0b, data]) + '\n')
+def _data_column(values, float_format):
+    '''Return the data values as they appeared in the input file, unless the
+    user asked for floats to be reformatted'''
+    if float_format is None:
+        return np.array(values)
+    return np.array(values, dtype=float)
 
 
 def run(args):
@@ -95,9 +145,12 @@ def run(args):
         "simple cases. This code is not suitable for all wiggle/bedgraph files."
     warn(MESS)
 
+    options = csv_writer.writer_options(args)
     with open(args.input_filepath, 'rt') as input_file:
-        with open(args.output_filepath, 'wt') as output_file:
+        with csv_writer.open_output(args.output_filepath) as output_file:
             if args.wig:
-                write_wig_to_csv(input_file, output_file, args.column_name)
+                write_wig_to_csv(input_file, output_file, args.column_name,
+                    **options)
             elif args.bed:
-                write_bed_to_csv(input_file, output_file, args.column_name)
+                write_bed_to_csv(input_file, output_file, args.column_name,
+                    **options)
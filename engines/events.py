@@ -9,12 +9,17 @@ chris.kimmel@live.com
 
 from argparse import RawTextHelpFormatter
 
+import csv_writer
+
 
 # pylint: disable=invalid-name,global-statement,import-outside-toplevel
 
 
 DEFAULT_CHRM = 'truncated_hiv_rna_genome'
 
+# The subparser made by register(), kept so that run() can report usage errors
+PARSER = None
+
 SLOTS_TO_IMPORT = [
     'norm_mean',
     'norm_stdev',
@@ -51,6 +56,7 @@ Usage Examples:
 from sys import stdin, stdout
 python prsconv3 events --wide=length tests/files/fast5_dir dwell_times.csv
 python prsconv3 events tests/files/fast5_dir events_tables.csv
+python prsconv3 events --shard-by read --shards 8 tests/files/fast5_dir events_tables
 '''
 
 
@@ -58,6 +64,7 @@ def register(subparsers):
     '''Add a subcommand to the subparsers object, thereby exposing the
     methods in this module via the command-line interface.'''
 
+    global PARSER
     parser = subparsers.add_parser('events',
         help='fast5 events tables from directories of fast5 files (this '
         'includes dwell times and current levels)', description=DESCRIPTION,
@@ -87,6 +94,11 @@ def register(subparsers):
         'written (including the .csv extension)', metavar='OUTPUT-FILEPATH',
         type=str)
 
+    csv_writer.add_arguments(parser)
+    csv_writer.add_shard_arguments(parser)
+
+    PARSER = parser
+
 
 def read_to_df(read, slots_to_import, corr_grp):
     '''
@@ -168,6 +180,8 @@ def run(args):
     '''This subroutine is called when the user selects the "events" module
     from the command line.'''
 
+    csv_writer.check_shard_args(PARSER, args, args.output_path)
+
     global tombo_helper, pd, np
     from tombo import tombo_helper
     import numpy as np
@@ -204,6 +218,5 @@ def run(args):
         #     values=args.wide
         # )
 
-        results.to_csv(args.output_path, index=True)
-    else:
-        results.to_csv(args.output_path, index=False)
+    csv_writer.write_output(results, args.output_path,
+        **csv_writer.writer_options(args), **csv_writer.shard_options(args))
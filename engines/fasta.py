@@ -12,6 +12,8 @@ chris.kimmel@live.com
 from warnings import warn
 from argparse import RawTextHelpFormatter
 
+import csv_writer
+
 
 DESCRIPTION = '''
 This command converts FASTA files to CSV files. The FASTA file must be of a
@@ -63,13 +65,19 @@ def register(subparsers):
     parser.add_argument('output_filepath', metavar='OUTPUT-FILEPATH',
         help='Where to write the CSV output (including the .csv extension)')
 
+    csv_writer.add_arguments(parser)
+
+
+def fasta_to_blocks(inbuffer, chunk_size=csv_writer.DEFAULT_CHUNK_SIZE):
+    '''Take a fasta file from inbuffer and return an iterator over blocks of
+    chunk_size positions. Each block is a list of three NumPy arrays,
+    "description", "pos_0b", and "base".
 
-def fasta_to_list_of_triples(inbuffer):
-    '''Take a fasta file from inbuffer and return a list of (description,
-    pos_0b, base) triples that represent every position on every sequence in
-    the file.
+    The file is read and checked before this function returns, but the blocks
+    are only built as they are consumed.'''
 
-    Every entry in every tuple is a string.'''
+    global np
+    import numpy as np
 
     # Get the first description
     description = inbuffer.readline()
@@ -77,34 +85,35 @@ def fasta_to_list_of_triples(inbuffer):
         '">"-initiated description.'
     description = description[1:].strip() # remove ">" symbol and surrounding whitespace
 
-    retval = []
-    pos = 0
-    for line in inbuffer.readlines():
-        line = line.strip() # to remove trailing \n
-        for base in line:
-            if base == '>':
-                raise NotImplementedError('This FASTA file appears to have '
-                    'multiple sequences in it. Only one sequence per FASTA is '
-                    'currently supported.')
-            retval.append((description, str(pos), base.upper()))
-            pos += 1
-    return retval
+    sequence = ''.join(line.strip() for line in inbuffer.readlines()).upper()
+    if '>' in sequence:
+        raise NotImplementedError('This FASTA file appears to have '
+            'multiple sequences in it. Only one sequence per FASTA is '
+            'currently supported.')
+
+    def blocks():
+        for start in range(0, len(sequence), chunk_size):
+            bases = np.array(list(sequence[start:start + chunk_size]), dtype='U1')
+            yield [
+                np.full(bases.size, description),
+                np.arange(start, start + bases.size),
+                bases,
+            ]
+
+    return blocks()
 
 
 def run(args):
     '''This subroutine is called when the user selects the "fasta" module
     from the command line.'''
-    global pd
-    import pandas as pd
-
     MESS = 'This module can currently only accept a FASTA file in which the '\
            'first line is a ">" identifier, and the remaining lines are the '\
            'corresponding nucleotide sequence.'
     warn(MESS)
 
     with open(args.input_filepath, 'rt') as input_file:
-        rows = fasta_to_list_of_triples(input_file)
+        blocks = fasta_to_blocks(input_file)
 
-    with open(args.output_filepath, 'wt') as output_file:
-        output_file.write(','.join(['description', 'pos_0b', 'base']) + '\n')
-        output_file.write('\n'.join(','.join(row) for row in rows) + '\n')
+    with csv_writer.open_output(args.output_filepath) as output_file:
+        csv_writer.write_blocks(output_file, ['description', 'pos_0b', 'base'],
+            blocks, **csv_writer.writer_options(args))
@@ -7,7 +7,14 @@ This module contains the code and interface for a tool that converts
 
 
 from argparse import RawTextHelpFormatter
+from functools import partial
 
+import csv_writer
+import samples
+
+
+# The subparser made by register(), kept so that run() can report usage errors
+PARSER = None
 
 DESCRIPTION = '''
 This command converts .tombo.per_read_stats files into CSV files.
@@ -26,6 +33,8 @@ the time this tool was written.
 Usage Examples:
 python prsconv3 per-read-stats --wide tests/files/23456_WT_cellular.tombo.per_read_stats output.csv
 python prsconv3 per-read-stats --long tests/file/23456_WT_cellular.tombo.per_read_stats output.csv
+python prsconv3 per-read-stats --long --shard-by position --shard-size 500 tests/file/23456_WT_cellular.tombo.per_read_stats output_dir
+python prsconv3 per-read-stats --long --sample WT=WT.tombo.per_read_stats --sample KO=KO.tombo.per_read_stats output.csv
 '''
 
 
@@ -43,9 +52,17 @@ The defaults (bases zero through one billion on the "+" strand of the
 "truncated_hiv_rna_genome") are correct for the analysis our team was doing at
 the time this tool was written.
 
+To compare samples, give "--sample NAME=PATH" once per .tombo.per_read_stats
+file instead of PRS-FILEPATH. The files are read concurrently (see "--workers")
+and merged into one table with an additional "sample" column. Long output is
+sorted by position; wide output has a row for every sample and read, and its
+position columns are aligned across samples.
+
 Usage Examples:
 python prsconv3 per-read-stats --wide tests/files/23456_WT_cellular.tombo.per_read_stats output.csv
 python prsconv3 per-read-stats --long tests/file/23456_WT_cellular.tombo.per_read_stats output.csv
+python prsconv3 per-read-stats --long --shard-by position --shard-size 500 tests/file/23456_WT_cellular.tombo.per_read_stats output_dir
+python prsconv3 per-read-stats --long --sample WT=WT.tombo.per_read_stats --sample KO=KO.tombo.per_read_stats output.csv
 '''
 
 
@@ -53,12 +70,14 @@ def register(subparsers):
     '''
     Register a subparser with the provided subparsers object
     '''
+    global PARSER
     parser = subparsers.add_parser('per-read-stats', description=DESCRIPTION,
                         help='.tombo.per_read_stats files',
                         formatter_class=RawTextHelpFormatter)
 
     parser.add_argument('input_filepath', help='Path of the .tombo.per_read_stats '
-                        + 'file to read', metavar='PRS-FILEPATH', type=str)
+                        + 'file to read', metavar='PRS-FILEPATH', type=str,
+                        nargs='?')
 
     parser.add_argument('output_filepath', help='Path of the CSV file to be '
                         + 'written (including the .csv extension)',
@@ -88,6 +107,13 @@ def register(subparsers):
                         + 'want statistics (DEFAULT: 1,000,000,000)',
                         metavar='END', default=10**9, type=int)
 
+    samples.add_arguments(parser)
+
+    csv_writer.add_arguments(parser)
+    csv_writer.add_shard_arguments(parser)
+
+    PARSER = parser
+
 
 def recarray_to_df(recarray):
     '''Convert record array output from tombo.tombo_stats.PerReadStatistics
@@ -105,48 +131,73 @@ def recarray_to_df(recarray):
     )
 
 
-def df_to_csv(series, output_path, wide_or_long):
+def read_per_read_stats(prs_path, chromosome, strand, start, end):
+    '''Read the per-read statistics in the given region of a
+    .tombo.per_read_stats file into a pandas dataframe (see recarray_to_df)'''
+
+    from tombo import tombo_helper, tombo_stats
+
+    reg = tombo_helper.intervalData(
+        chrm=chromosome,
+        start=start,
+        end=end,
+        strand=strand,
+    )
+    prs_recarray = (
+        tombo_stats.PerReadStats(prs_path)
+        .get_region_per_read_stats(reg)
+    )
+    return recarray_to_df(prs_recarray)
+
+
+def df_to_csv(series, output_path, wide_or_long, **kwargs):
     '''Print dataframe output from recarray_to_series to a CSV file at output_path.
 
     If wide_to_long == 'wide', the output CSV will have a row for every read and
     a column for every position. Otherwise, if wide_to_long == 'long', the
     output will be a three-column CSV file.
+
+    Additional keyword arguments are passed on to csv_writer.write_output.
     '''
     if wide_or_long == 'wide':
         # The three operations below that involve 'stat_level' are just to delete
         # extraneous labelling information from the table before we export to CSV
-        (
+        series = (
             series
             .rename_axis('stat_level', axis=1)
             .unstack('pos_0b')
             .stack('stat_level')
             .reset_index('stat_level', drop=True)
-            .to_csv(output_path)
         )
-    elif wide_or_long == 'long':
-        series.to_csv(output_path)
-    else:
+    elif wide_or_long != 'long':
         raise NotImplementedError(
             f'"{wide_or_long}" not valid. Supported options: "wide" and "long"')
 
+    csv_writer.write_output(series, output_path, **kwargs)
+
 
 def run(args):
     '''This subroutine is called when the user selects the "fasta" module
     from the command line.'''
 
-    from tombo import tombo_helper, tombo_stats
+    global np
+    import numpy as np
 
+    samples.check_args(PARSER, args)
+    csv_writer.check_shard_args(PARSER, args, args.output_filepath)
     wide_or_long = 'wide' if args.wide else 'long'
 
-    reg = tombo_helper.intervalData(
-        chrm=args.chromosome,
-        start=args.start,
-        end=args.end,
-        strand=args.strand,
-    )
-    prs_recarray = (
-        tombo_stats.PerReadStats(args.input_filepath)
-        .get_region_per_read_stats(reg)
-    )
-    df = recarray_to_df(prs_recarray)
-    df_to_csv(df, wide_or_long=wide_or_long, output_path=args.output_filepath)
+    read_func = partial(read_per_read_stats, chromosome=args.chromosome,
+                        strand=args.strand, start=args.start, end=args.end)
+    if args.samples:
+        df = samples.read_samples(read_func, args.samples,
+                                  workers=args.workers,
+                                  processes=args.processes)
+        if wide_or_long == 'long':
+            positions = df.index.get_level_values('pos_0b')
+            df = df.iloc[np.argsort(positions, kind='stable')]
+    else:
+        df = read_func(args.input_filepath)
+    df_to_csv(df, wide_or_long=wide_or_long, output_path=args.output_filepath,
+              **csv_writer.writer_options(args),
+              **csv_writer.shard_options(args))
@@ -12,6 +12,12 @@ chris.kimmel@live.com
 
 from argparse import RawTextHelpFormatter
 
+import csv_writer
+import samples
+
+
+# The subparser made by register(), kept so that run() can report usage errors
+PARSER = None
 
 DESCRIPTION = '''
 Convert .tombo.stats files to CSV files
@@ -31,8 +37,15 @@ The output CSV file will have columns named "pos_0b", "chrm", "strand",
 "damp_frac", and "frac". Additional columns may be present if other statistics
 are stored in the statistics file.
 
+To compare samples, give "--sample NAME=PATH" once per statistics file instead
+of STATS-FILEPATH. The files are read concurrently (see "--workers") and merged
+into one table, sorted by position, with an additional "sample" column. With
+"--wide", the output instead has one row per position and one column per
+statistic and sample (e.g. "frac_WT" and "frac_KO").
+
 Usage Examples:
 python prsconv3 stats tests/files/stats/23456_WT_cellular.tombo.stats 23456_WT_cellular.csv
+python prsconv3 stats --wide --sample WT=23456_WT_cellular.tombo.stats --sample KO=23456_KO_cellular.tombo.stats WT_vs_KO.csv
 '''
 
 
@@ -40,17 +53,29 @@ def register(subparsers):
     '''Add a subcommand to the given subparsers object. The subcommand will
     expose the functionality of this module via the command-line.
     '''
+    global PARSER
     parser = subparsers.add_parser('stats', help='.tombo.stats files',
                         description=DESCRIPTION,
                         formatter_class=RawTextHelpFormatter)
 
     parser.add_argument('input_filepath', help='Path of the .tombo.stats '
-                        + 'file', metavar='STATS-FILEPATH', type=str)
+                        + 'file', metavar='STATS-FILEPATH', type=str,
+                        nargs='?')
 
     parser.add_argument('output_filepath', help='Path of the CSV file to be '
                         + 'written (including the .csv extension)',
                         metavar='OUTPUT-FILEPATH', type=str)
 
+    samples.add_arguments(parser)
+
+    parser.add_argument('--wide', action='store_true',
+                        help='With --sample, write one row per position and '
+                        'one column per statistic and sample')
+
+    csv_writer.add_arguments(parser)
+
+    PARSER = parser
+
 
 def stats_to_df(stats_path):
     '''Open a Tombo statistics file and return it as a pandas DataFrame'''
@@ -82,6 +107,28 @@ def stats_to_df(stats_path):
     return pd.concat(to_concat).rename({'pos': 'pos_0b'}, axis=1)
 
 
+def samples_to_wide(df):
+    '''Convert the output of samples.read_samples(stats_to_df, ...) into a
+    DataFrame indexed by ['chrm', 'strand', 'pos_0b'], with a column named
+    "<statistic>_<sample>" for every statistic and sample'''
+
+    global pd
+    import pandas as pd
+
+    names = list(df.index.get_level_values('sample').unique())
+    position_cols = ['chrm', 'strand', 'pos_0b']
+    stat_cols = [col for col in df.columns if col not in position_cols]
+
+    wide = (
+        df
+        .reset_index('sample')
+        .pivot(index=position_cols, columns='sample', values=stat_cols)
+        .reindex(columns=pd.MultiIndex.from_product([stat_cols, names]))
+    )
+    wide.columns = [f'{stat}_{name}' for stat, name in wide.columns]
+    return wide
+
+
 def run(args):
     '''This subroutine is called when the user selects the "stats" module
     from the command line.'''
@@ -91,5 +138,25 @@ def run(args):
     This module was designed to work with Tombo ModelStats objects.  I have not
     tested it on Tombo LevelStats objects.'''
 
-    df = stats_to_df(args.input_filepath)
-    df.to_csv(args.output_filepath, index=False)
+    samples.check_args(PARSER, args)
+    if args.wide and not args.samples:
+        PARSER.error('--wide can only be used with --sample')
+
+    if args.samples:
+        df = samples.read_samples(stats_to_df, args.samples,
+                                  workers=args.workers,
+                                  processes=args.processes)
+        if args.wide:
+            df = samples_to_wide(df).reset_index()
+        else:
+            df = (
+                df
+                .reset_index('sample')
+                .sort_values(['chrm', 'strand', 'pos_0b'], kind='stable')
+            )
+    else:
+        df = stats_to_df(args.input_filepath)
+
+    with csv_writer.open_output(args.output_filepath) as output_file:
+        csv_writer.write_df(df, output_file, index=False,
+                            **csv_writer.writer_options(args))
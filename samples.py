@@ -0,0 +1,95 @@
+'''
+This module contains the code shared by the engines that can read several
+labelled samples (e.g. a wild-type and a mutant) and merge them into one table.
+
+Samples are read concurrently by a pool of worker threads or processes. The
+results are concatenated with an outer index level named "sample".
+'''
+
+# pylint: disable=invalid-name,global-statement,import-outside-toplevel
+
+
+import os
+from argparse import ArgumentTypeError
+
+
+def parse_sample(text):
+    '''Split a command-line argument of the form NAME=PATH into a (name, path)
+    pair'''
+    name, sep, path = text.partition('=')
+    if not sep or not name or not path:
+        raise ArgumentTypeError(f'"{text}" is not of the form NAME=PATH')
+    return name, path
+
+
+def add_arguments(parser):
+    '''Attach the --sample option to the given parser. The parser's input-file
+    argument should be optional (nargs='?'), because --sample is used instead
+    of it.'''
+
+    parser.add_argument('--sample', metavar='NAME=PATH', dest='samples',
+        type=parse_sample, action='append', default=None,
+        help='Read the file at PATH and label its rows with NAME in a '
+        '"sample" column. Give this option once per sample, in place of the '
+        'input filepath.')
+
+
+def check_args(parser, args):
+    '''Make sure the user gave either a single input file or one or more
+    --sample options with distinct names, but not both. Mistakes are reported
+    through parser.error.'''
+
+    if args.samples and args.input_filepath is not None:
+        parser.error('give either an input file or --sample options, not both')
+    if not args.samples and args.input_filepath is None:
+        parser.error('give either an input file or at least one --sample '
+            'option')
+    if args.samples:
+        names = [name for name, _ in args.samples]
+        if len(set(names)) != len(names):
+            parser.error(f'sample names must be unique (got {names})')
+
+
+def read_samples(read_func, samples, workers=None, processes=False):
+    '''
+    Read several samples concurrently and concatenate them.
+
+    Arguments:
+        read_func:
+            function that takes the path of one sample and returns a pandas
+            DataFrame. It must be defined at module level (or be a
+            functools.partial of such a function), so that it can be sent to
+            worker processes.
+        samples:
+            list of (name, path) pairs, as returned by parse_sample
+        workers:
+            number of samples to read at a time. If None, read every sample
+            at once (up to the number of CPUs) in worker processes.
+        processes:
+            read samples in worker processes rather than worker threads when
+            workers is given. Tombo files are HDF5 files, and h5py serializes
+            reads across threads, so only processes make the reads truly
+            overlap.
+
+    Returns:
+        pandas dataframe:
+            the DataFrames returned by read_func, in the order of samples, with
+            an additional outer index level named "sample"
+    '''
+    global pd, futures
+    import pandas as pd
+    from concurrent import futures
+
+    names = [name for name, _ in samples]
+    paths = [path for _, path in samples]
+
+    if workers is None:
+        workers = min(len(samples), os.cpu_count() or 1)
+        processes = True
+
+    executor_cls = futures.ProcessPoolExecutor if processes \
+        else futures.ThreadPoolExecutor
+    with executor_cls(max_workers=max(workers, 1)) as executor:
+        dfs = list(executor.map(read_func, paths))
+
+    return pd.concat(dfs, keys=names, names=['sample'])
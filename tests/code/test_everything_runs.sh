@@ -13,4 +13,10 @@ python3 . fasta tests/files/fasta/RNA_section__454_9627.fa test_output/fasta.csv
 && python3 . per-read-stats --long tests/files/per_read_stats/23456_WT_cellular.tombo.per_read_stats test_output/per_read_stats_1.csv \
 && python3 . per-read-stats --wide tests/files/per_read_stats/23456_WT_cellular.tombo.per_read_stats test_output/per_read_stats_2.csv \
 && python3 . events tests/files/fast5_dir test_output/events_1.csv \
-&& python3 . events --wide=length tests/files/fast5_dir test_output/events_2.csv
+&& python3 . events --wide=length tests/files/fast5_dir test_output/events_2.csv \
+&& python3 . stats --float-format %.4g --workers 2 tests/files/stats/23456_WT_cellular.tombo.stats test_output/stats.csv.gz \
+&& python3 . per-read-stats --wide --workers 2 --processes tests/files/per_read_stats/23456_WT_cellular.tombo.per_read_stats test_output/per_read_stats_3.csv.gz \
+&& python3 . per-read-stats --long --shard-by position --shards 4 tests/files/per_read_stats/23456_WT_cellular.tombo.per_read_stats test_output/per_read_stats_shards \
+&& python3 . events --wide=length --shard-by read --shard-size 2 --workers 2 tests/files/fast5_dir test_output/events_shards.gz \
+&& python3 . stats --wide --workers 2 --processes --sample WT=tests/files/stats/23456_WT_cellular.tombo.stats --sample WT2=tests/files/stats/23456_WT_cellular.tombo.stats test_output/stats_samples.csv \
+&& python3 . per-read-stats --long --workers 2 --sample WT=tests/files/per_read_stats/23456_WT_cellular.tombo.per_read_stats --sample WT2=tests/files/per_read_stats/23456_WT_cellular.tombo.per_read_stats test_output/per_read_stats_samples.csv